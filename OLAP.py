@@ -1,8 +1,41 @@
 # OLAP SCHEMA DESIGN
 
+import functools
 import sqlite3
 import logger as log
 
+
+def apply_sqlite_pragmas(conn, db_path):
+    """Tune a SQLite connection for bulk loading (WAL + relaxed sync)."""
+    if db_path == ":memory:":
+        return
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-64000")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_connection(db_path):
+    """Shared per-path SQLite connection: repeated pipeline runs reuse the
+    open handle (and its PRAGMA setup) instead of reopening the file every
+    time. Left open for the life of the process."""
+    conn = sqlite3.connect(db_path)
+    apply_sqlite_pragmas(conn, db_path)
+    return conn
+
+
+def attach_oltp(conn, oltp_db):
+    """ATTACH the OLTP database as 'oltp' unless it already is."""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if "oltp" not in attached:
+        conn.execute(f"ATTACH DATABASE '{oltp_db}' AS oltp;")
+
+
 def create_and_populate_olap_schema_from_oltp(olap_db="olap_db.sqlite", oltp_db="fin_db.sqlite"):
     """
     Create OLAP schema (star schema) and populate it from OLTP database.
@@ -11,12 +44,14 @@ def create_and_populate_olap_schema_from_oltp(olap_db="olap_db.sqlite", oltp_db=
         olap_db (str): Path to OLAP SQLite DB file
         oltp_db (str): Path to OLTP SQLite DB file
     """
-    # connect to OLAP DB
-    conn = sqlite3.connect(olap_db)
+    # connect to OLAP DB (shared, reused across runs)
+    conn = get_connection(olap_db)
+    attach_oltp(conn, oltp_db)
     cur = conn.cursor()
 
-    # Attach OLTP DB
-    cur.execute(f"ATTACH DATABASE '{oltp_db}' AS oltp;")
+    # Make sure the fact->filing join below has an index on the source side
+    # (older OLTP databases may predate the model-level indexes)
+    cur.execute("CREATE INDEX IF NOT EXISTS oltp.ix_fact_filing ON financial_fact(filing_id);")
 
     # 1. Create Schema
     cur.executescript("""
@@ -62,16 +97,16 @@ def create_and_populate_olap_schema_from_oltp(olap_db="olap_db.sqlite", oltp_db=
         FOREIGN KEY (statement_type_key) REFERENCES statement_type_dim(statement_type_key)
     );
     """)
-    conn.commit()
 
     # 2. Populate Dimensions
+    # (single transaction for the whole populate; committed once at the end
+    # so the rebuild is atomic and pays one fsync instead of four)
 
     # company_dim
     cur.execute("""
     INSERT OR REPLACE INTO company_dim (company_key, cik, ticker, company_name)
     SELECT company_id, company_id, ticker, ticker FROM oltp.company;
     """)
-    conn.commit()
 
     # date_dim
     cur.execute("""
@@ -85,14 +120,12 @@ def create_and_populate_olap_schema_from_oltp(olap_db="olap_db.sqlite", oltp_db=
         CAST(strftime('%d', filing_date) AS INT) AS day
     FROM oltp.filing;
     """)
-    conn.commit()
 
     # statement_type_dim
     cur.execute("""
     INSERT OR REPLACE INTO statement_type_dim (statement_type_key, statement_type)
     SELECT statement_type_id, name FROM oltp.statement_type;
     """)
-    conn.commit()
 
     # 3. Populate Fact Table
     cur.execute("""
@@ -109,6 +142,5 @@ def create_and_populate_olap_schema_from_oltp(olap_db="olap_db.sqlite", oltp_db=
     """)
     conn.commit()
 
-    conn.close()
     log.logger.info("OLAP schema created & populated successfully!")
 
@@ -4,11 +4,11 @@ ETL: load single dataframe of financial statements into a normalized OLTP schema
 """
 
 import pandas as pd
-from sqlalchemy import (create_engine, Column, Integer, String, Date, Boolean, Numeric, ForeignKey, UniqueConstraint, MetaData)
+from sqlalchemy import (create_engine, event, Column, Integer, String, Date, Boolean, Numeric, ForeignKey, UniqueConstraint, Index, MetaData)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.dialects.postgresql import insert as pg_insert  # optional PG upsert
-from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert  # native ON CONFLICT upsert
+from datetime import date
 import logger as log
 
 # -------------------------
@@ -25,6 +25,22 @@ SessionLocal = sessionmaker(bind=engine, autoflush=False, future=True)
 Base = declarative_base()
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    # WAL + relaxed sync cut per-commit fsync cost on this write-heavy load.
+    # WAL is persistent and has no effect on in-memory databases, so skip those.
+    if ":memory:" in DATABASE_URL:
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
 class Company(Base):
     __tablename__ = "company"
     company_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -40,7 +56,10 @@ class Filing(Base):
     is_audited = Column(Boolean)
     # uniqueness: company + filing_date + fiscal_year + is_audited
     __table_args__ = (UniqueConstraint('company_id', 'filing_date', 'fiscal_year', 'is_audited',
-                                       name='uq_filing_company_date_year_audited'),)
+                                       name='uq_filing_company_date_year_audited'),
+                      # covers the per-load "filings for these companies" lookup
+                      Index('ix_filing_company_date', 'company_id', 'filing_date',
+                            'fiscal_year', 'is_audited'),)
 
     company = relationship("Company")
 
@@ -66,6 +85,9 @@ class FinancialFact(Base):
     period_type = Column(String(50))
     end_date = Column(Date)
     value = Column(Numeric(20, 2))
+    # speed up the OLAP fact build joins on filing_id / line_item_id
+    __table_args__ = (Index('ix_fact_filing', 'filing_id'),
+                      Index('ix_fact_line_item', 'line_item_id'),)
 
 
 # -------------------------
@@ -77,35 +99,59 @@ Base.metadata.create_all(bind=engine)
 # -------------------------
 # Helper functions
 # -------------------------
-def parse_date(d):
-    if pd.isna(d):
-        return None
-    if isinstance(d, (datetime, pd.Timestamp)):
-        return d.date()
-    # Try common formats:
-    for fmt in ("%B %d, %Y", "%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y", "%d-%b-%Y"):
-        try:
-            return datetime.strptime(str(d), fmt).date()
-        except Exception:
-            pass
-    # last resort: pandas
-    try:
-        return pd.to_datetime(d, errors="coerce").date()
-    except Exception:
-        return None
-
-
-def to_bool(v):
-    if pd.isna(v):
-        return None
-    if isinstance(v, bool):
-        return v
-    s = str(v).strip().lower()
-    if s in ("true", "1", "t", "yes", "y"):
-        return True
-    if s in ("false", "0", "f", "no", "n"):
-        return False
-    return None
+def parse_date_series(s: pd.Series) -> pd.Series:
+    """Vectorized date parsing: try the fast ISO format on the whole column,
+    then let pandas' mixed-format parser handle only the leftovers."""
+    raw = s.astype(str).str.strip()
+    parsed = pd.to_datetime(raw, format="%Y-%m-%d", errors="coerce")
+    misses = parsed.isna() & s.notna()
+    if misses.any():
+        parsed[misses] = pd.to_datetime(raw[misses], format="mixed", errors="coerce")
+    return parsed.dt.date
+
+
+_BOOL_MAP = {
+    "true": True, "1": True, "t": True, "yes": True, "y": True,
+    "false": False, "0": False, "f": False, "no": False, "n": False,
+}
+
+
+def to_bool_series(s: pd.Series) -> pd.Series:
+    """Vectorized truthy/falsy string mapping; unrecognized values become None."""
+    b = s.astype(str).str.strip().str.lower().map(_BOOL_MAP)
+    return b.astype(object).where(b.notna(), None)
+
+
+def _select_by_keys(conn, keys, sql):
+    """Run a SELECT that joins against a temp table of keys.
+
+    Loads `keys` into TEMP TABLE _keys and executes `sql` (which must join
+    ON ... = k.k). Unlike a large IN (?,?,...) list this never hits SQLite's
+    bound-parameter limit and the lookup is an indexed join.
+    """
+    cur = conn.connection.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _keys (k PRIMARY KEY)")
+    cur.execute("DELETE FROM _keys")
+    cur.executemany("INSERT OR IGNORE INTO _keys VALUES (?)", [(k,) for k in keys])
+    rows = cur.execute(sql).fetchall()
+    cur.execute("DELETE FROM _keys")
+    cur.close()
+    return rows
+
+
+def _fetch_filing_map(conn, company_ids):
+    """Map (company_id, filing_date, fiscal_year, is_audited) -> filing_id
+    for the given companies."""
+    rows = _select_by_keys(
+        conn, company_ids,
+        "SELECT f.company_id, f.filing_date, f.fiscal_year, f.is_audited, f.filing_id "
+        "FROM filing f JOIN _keys k ON f.company_id = k.k")
+    filing_map = {}
+    for cid, fdate, fy, aud, fid in rows:
+        fdate = date.fromisoformat(fdate) if fdate else None
+        aud = bool(aud) if aud is not None else None
+        filing_map[(cid, fdate, fy, aud)] = fid
+    return filing_map
 
 
 # -------------------------
@@ -130,60 +176,56 @@ def load_dataframe_to_db(df: pd.DataFrame):
     })
 
     # Clean & parse
-    df['filing_date_parsed'] = df['filing_date'].apply(parse_date)
-    df['end_date_parsed'] = df['end_date'].apply(parse_date)
-    df['is_audited_bool'] = df['is_audited'].apply(to_bool)
+    df['filing_date_parsed'] = parse_date_series(df['filing_date'])
+    df['end_date_parsed'] = parse_date_series(df['end_date'])
+    df['is_audited_bool'] = to_bool_series(df['is_audited'])
     # Ensure numeric values
     df['value'] = pd.to_numeric(df['value'], errors='coerce')
 
-    session = SessionLocal()
-    try:
+    # One outer transaction for the whole load: every intermediate commit on
+    # SQLite means an fsync, so the dim upserts and the fact insert all ride
+    # on a single BEGIN ... COMMIT (rolled back as a unit on error).
+    with engine.begin() as conn:
         # -------------------------
         # 1) Upsert companies (tickers)
         # -------------------------
-        tickers = df['ticker'].dropna().astype(str).str.upper().unique().tolist()
-
-        # Fetch existing
-        existing_companies = session.query(Company).filter(Company.ticker.in_(tickers)).all()
-        existing_ticker_map = {c.ticker: c.company_id for c in existing_companies}
-
-        new_company_objs = []
-        for t in tickers:
-            if t not in existing_ticker_map:
-                new_company_objs.append({"ticker": t})
-
-        if new_company_objs:
-            session.bulk_insert_mappings(Company, new_company_objs)
-            session.commit()
-            # refresh existing map
-            existing_companies = session.query(Company).filter(Company.ticker.in_(tickers)).all()
-            existing_ticker_map = {c.ticker: c.company_id for c in existing_companies}
+        # ON CONFLICT DO NOTHING lets each dim upsert be a single INSERT plus
+        # one SELECT to read the ids back, instead of fetch/diff/insert/refetch.
+        # unique first, then normalize only the handful of unique values
+        # (avoids str-casting/uppercasing every repeated row)
+        tickers = list(dict.fromkeys(
+            str(t).upper() for t in pd.unique(df['ticker'].dropna().to_numpy())))
+        if tickers:
+            conn.execute(
+                sqlite_insert(Company.__table__).on_conflict_do_nothing(index_elements=['ticker']),
+                [{"ticker": t} for t in tickers])
+        existing_ticker_map = dict(_select_by_keys(
+            conn, tickers,
+            "SELECT c.ticker, c.company_id FROM company c JOIN _keys k ON c.ticker = k.k"))
 
         # -------------------------
         # 2) Upsert statement types
         # -------------------------
-        stmt_names = df['statement_type'].dropna().astype(str).unique().tolist()
-        existing_stmt = session.query(StatementType).filter(StatementType.name.in_(stmt_names)).all()
-        existing_stmt_map = {s.name: s.statement_type_id for s in existing_stmt}
-        new_stmt_objs = [{"name": s} for s in stmt_names if s not in existing_stmt_map]
-        if new_stmt_objs:
-            session.bulk_insert_mappings(StatementType, new_stmt_objs)
-            session.commit()
-            existing_stmt = session.query(StatementType).filter(StatementType.name.in_(stmt_names)).all()
-            existing_stmt_map = {s.name: s.statement_type_id for s in existing_stmt}
+        stmt_names = [str(s) for s in pd.unique(df['statement_type'].dropna().to_numpy())]
+        if stmt_names:
+            conn.execute(
+                sqlite_insert(StatementType.__table__).on_conflict_do_nothing(index_elements=['name']),
+                [{"name": s} for s in stmt_names])
+        existing_stmt_map = dict(_select_by_keys(
+            conn, stmt_names,
+            "SELECT s.name, s.statement_type_id FROM statement_type s JOIN _keys k ON s.name = k.k"))
 
         # -------------------------
         # 3) Upsert line items
         # -------------------------
-        li_names = df['line_item'].dropna().astype(str).unique().tolist()
-        existing_li = session.query(LineItem).filter(LineItem.name.in_(li_names)).all()
-        existing_li_map = {li.name: li.line_item_id for li in existing_li}
-        new_li_objs = [{"name": li} for li in li_names if li not in existing_li_map]
-        if new_li_objs:
-            session.bulk_insert_mappings(LineItem, new_li_objs)
-            session.commit()
-            existing_li = session.query(LineItem).filter(LineItem.name.in_(li_names)).all()
-            existing_li_map = {li.name: li.line_item_id for li in existing_li}
+        li_names = [str(li) for li in pd.unique(df['line_item'].dropna().to_numpy())]
+        if li_names:
+            conn.execute(
+                sqlite_insert(LineItem.__table__).on_conflict_do_nothing(index_elements=['name']),
+                [{"name": li} for li in li_names])
+        existing_li_map = dict(_select_by_keys(
+            conn, li_names,
+            "SELECT li.name, li.line_item_id FROM line_item li JOIN _keys k ON li.name = k.k"))
 
         # -------------------------
         # 4) Upsert filings (unique per company + filing_date + fiscal_year + is_audited)
@@ -206,100 +248,107 @@ def load_dataframe_to_db(df: pd.DataFrame):
             })
 
         # Fetch existing filings to avoid duplicates
-        # Build a set of keys to check
+        # Note: this query looks for filings for the companies involved.
         existing_filing_map = {}
         if filings_to_create:
-            # Query possible matching filings
-            # Note: this query looks for filings for the companies involved.
             company_ids = list({f['company_id'] for f in filings_to_create})
-            existing_filings = session.query(Filing).filter(Filing.company_id.in_(company_ids)).all()
-            for f in existing_filings:
-                key = (f.company_id, f.filing_date, f.fiscal_year, f.is_audited)
-                existing_filing_map[key] = f.filing_id
+            existing_filing_map = _fetch_filing_map(conn, company_ids)
 
-        # Insert only missing filings
+        # Insert only missing filings (dedup by key: mixed-case tickers can
+        # collapse to the same company after normalization)
         new_filings = []
+        seen_keys = set()
         for f in filings_to_create:
             key = (f['company_id'], f['filing_date'], f['fiscal_year'], f['is_audited'])
-            if key not in existing_filing_map:
+            if key not in existing_filing_map and key not in seen_keys:
+                seen_keys.add(key)
                 new_filings.append(f)
         if new_filings:
-            session.bulk_insert_mappings(Filing, new_filings)
-            session.commit()
+            conn.execute(Filing.__table__.insert(), new_filings)
             # refresh filing map
-            company_ids = list({f['company_id'] for f in filings_to_create})
-            existing_filings = session.query(Filing).filter(Filing.company_id.in_(company_ids)).all()
-            for f in existing_filings:
-                key = (f.company_id, f.filing_date, f.fiscal_year, f.is_audited)
-                existing_filing_map[key] = f.filing_id
+            existing_filing_map = _fetch_filing_map(conn, company_ids)
 
 
         # 5) Prepare facts and bulk insert
-        # Map helper lookups in memory
-        ticker_to_company_id = existing_ticker_map
-        stmtname_to_id = existing_stmt_map
-        lineitem_to_id = existing_li_map
+        # Series-backed lookups: .map(Series) resolves ids through one
+        # vectorized reindex per column instead of per-row dict hits
+        company_map = pd.Series(existing_ticker_map)
+        stmt_map = pd.Series(existing_stmt_map)
+        li_map = pd.Series(existing_li_map)
         # existing_filing_map maps (company_id, filing_date, fiscal_year, is_audited) -> filing_id
 
-        # Build financial_fact dictionaries
-        fact_rows = []
-        for _, r in df.iterrows():
-            t = str(r.get('ticker')) if pd.notna(r.get('ticker')) else None
-            if t is None:
-                continue
-            t = t.upper()
-            company_id = ticker_to_company_id.get(t)
-            filing_date = r.get('filing_date_parsed')
-            fy = int(r['fiscal_year']) if pd.notna(r.get('fiscal_year')) else None
-            is_aud = bool(r['is_audited_bool']) if r['is_audited_bool'] is not None else None
-            filing_key = (company_id, filing_date, fy, is_aud)
-            filing_id = existing_filing_map.get(filing_key)
-            # If filing_id missing (maybe because filing_date parsing failed), skip
-            if filing_id is None:
-                # try to find filing by company+filing_date only as fallback
-                fallback_filings = [k for k in existing_filing_map.keys() if k[0] == company_id and k[1] == filing_date]
-                if fallback_filings:
-                    filing_id = existing_filing_map[fallback_filings[0]]
-                else:
-                    # can't map filing -> skip row (log/collect later)
-                    continue
-
-            stmt_name = r.get('statement_type')
-            line_item_name = r.get('line_item')
-            if pd.isna(stmt_name) or pd.isna(line_item_name):
-                continue
-            stmt_id = stmtname_to_id.get(stmt_name)
-            li_id = lineitem_to_id.get(line_item_name)
-            # If any id missing (shouldn't be), skip
-            if stmt_id is None or li_id is None:
-                continue
-
-            end_date = r.get('end_date_parsed')
-            val = r.get('value')
-            # Accept null values too (store as NULL)
-            fact_rows.append({
-                "filing_id": filing_id,
-                "statement_type_id": stmt_id,
-                "line_item_id": li_id,
-                "period_type": r.get('period_type'),
-                "end_date": end_date,
-                "value": float(val) if pd.notna(val) else None
-            })
-
-        # Bulk insert facts in chunks
-        for i in range(0, len(fact_rows), BATCH_SIZE):
-            chunk = fact_rows[i:i + BATCH_SIZE]
-            if chunk:
-                session.bulk_insert_mappings(FinancialFact, chunk)
-                session.commit()
-
-        log.logger.info(f"OLTP Inserted/Updated: companies={len(existing_ticker_map)}, "
-              f"statement_types={len(existing_stmt_map)}, line_items={len(existing_li_map)}, "
-              f"filings={len(existing_filing_map)}, facts={len(fact_rows)}")
-
-    except Exception as exc:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+        # Build financial_fact rows in one vectorized pass (maps + merges)
+        # instead of a per-row Python loop over df.iterrows()
+        facts = df[['ticker', 'statement_type', 'line_item', 'period_type',
+                    'end_date_parsed', 'value', 'filing_date_parsed',
+                    'fiscal_year', 'is_audited_bool']].copy()
+        facts = facts.dropna(subset=['ticker', 'statement_type', 'line_item'])
+
+        facts['ticker'] = facts['ticker'].astype(str).str.upper()
+        facts['company_id'] = facts['ticker'].map(company_map)
+        facts['statement_type_id'] = facts['statement_type'].map(stmt_map)
+        facts['line_item_id'] = facts['line_item'].map(li_map)
+        facts['fiscal_year'] = pd.to_numeric(facts['fiscal_year'], errors='coerce').astype('Int64')
+
+        # Join filing_id on the full uniqueness key
+        filing_lookup = pd.DataFrame(
+            [key + (fid,) for key, fid in existing_filing_map.items()],
+            columns=['company_id', 'filing_date_parsed', 'fiscal_year', 'is_audited_bool', 'filing_id']
+        )
+        if not filing_lookup.empty:
+            filing_lookup['fiscal_year'] = filing_lookup['fiscal_year'].astype('Int64')
+            facts = facts.merge(
+                filing_lookup,
+                on=['company_id', 'filing_date_parsed', 'fiscal_year', 'is_audited_bool'],
+                how='left')
+            # Fallback: match on company + filing_date only (e.g. when
+            # fiscal_year/is_audited parsing failed for some rows)
+            if facts['filing_id'].isna().any():
+                fallback = (filing_lookup
+                            .drop_duplicates(['company_id', 'filing_date_parsed'])
+                            [['company_id', 'filing_date_parsed', 'filing_id']]
+                            .rename(columns={'filing_id': 'filing_id_fallback'}))
+                facts = facts.merge(fallback, on=['company_id', 'filing_date_parsed'], how='left')
+                facts['filing_id'] = facts['filing_id'].fillna(facts['filing_id_fallback'])
+                facts = facts.drop(columns=['filing_id_fallback'])
+        else:
+            facts['filing_id'] = None
+
+        # Rows that can't be mapped to a filing or dimension are skipped, as before
+        facts = facts.dropna(subset=['filing_id', 'statement_type_id', 'line_item_id'])
+
+        fact_df = pd.DataFrame({
+            "filing_id": facts['filing_id'].astype(int),
+            "statement_type_id": facts['statement_type_id'].astype(int),
+            "line_item_id": facts['line_item_id'].astype(int),
+            "period_type": facts['period_type'],
+            # ISO strings, matching how SQLAlchemy's Date type stores them
+            "end_date": facts['end_date_parsed'].map(lambda d: d.isoformat() if pd.notna(d) else None),
+            "value": facts['value'].astype(float),
+        })
+        # Accept null values too (store as NULL)
+        fact_df = fact_df.astype(object).where(fact_df.notna(), None)
+        fact_rows = fact_df.to_dict(orient='records')
+
+        # Bulk insert facts as multi-row INSERT statements on the DBAPI cursor
+        # of the same transaction (far fewer statements to prepare than
+        # row-wise inserts); the outer engine.begin() commits everything once.
+        fact_cols = ("filing_id", "statement_type_id", "line_item_id",
+                     "period_type", "end_date", "value")
+        # SQLite caps bound parameters at 999 per statement
+        rows_per_stmt = 999 // len(fact_cols)
+        cur = conn.connection.cursor()
+        for i in range(0, len(fact_rows), rows_per_stmt):
+            chunk = fact_rows[i:i + rows_per_stmt]
+            sql = ("INSERT INTO financial_fact "
+                   "(filing_id, statement_type_id, line_item_id, period_type, end_date, value) "
+                   "VALUES " + ",".join(["(?,?,?,?,?,?)"] * len(chunk)))
+            flat = [row[c] for row in chunk for c in fact_cols]
+            cur.execute(sql, flat)
+        cur.close()
+
+        log.logger.info("OLTP Inserted/Updated: companies=%d, statement_types=%d, "
+              "line_items=%d, filings=%d, facts=%d",
+              len(existing_ticker_map), len(existing_stmt_map), len(existing_li_map),
+              len(existing_filing_map), len(fact_rows))
 
@@ -1,7 +1,18 @@
 import re
 import os
+import numpy as np
 import pandas as pd
 
+# Matches filenames like CATX_20250813_PR.html -> (ticker, yyyymmdd)
+_META_RE = re.compile(r"([A-Z]+)_(\d{8})_")
+
+# Period-label patterns, compiled once at import
+_DATE_RE = re.compile(
+    r"((?:January|February|March|April|May|June|July|August|September|October|November|December)"
+    r"\s+\d{1,2},?\s*\d{4})")
+_YEAR_RE = re.compile(r"(\d{4})")
+
+
 def read_unique_links(txt_file: str):
     unique_links = set()
     with open(txt_file, "r") as f:
@@ -63,7 +74,7 @@ def extract_metadata(file_path: str):
     filename = os.path.basename(file_path)
     
     # Regex to match: TICKER_YYYYMMDD_XX.ext
-    match = re.match(r"([A-Z]+)_(\d{8})_", filename)
+    match = _META_RE.match(filename)
     if not match:
         raise ValueError(f"Filename does not match expected pattern: {filename}")
     
@@ -75,33 +86,46 @@ def extract_metadata(file_path: str):
 
 
 
-# 2. Extract structured period info
-def parse_period(p):
+# 2. Extract structured period info (vectorized: one pass over the column
+#    instead of several regex searches per row)
+def parse_period_vec(periods: pd.Series) -> pd.DataFrame:
+    """
+    Parse a Series of period labels like
+    "Three Months Ended June 30, 2025 (unaudited)" into a DataFrame with
+    columns [Period Type, End Date, Unaudited, Fiscal Year].
+    """
+    full = periods.astype(str)
+    # The same handful of period labels repeats for every line item, so parse
+    # each distinct label once and broadcast the results back at the end
+    s = full.drop_duplicates()
+
     # Unaudited flag
-    unaudited = "unaudited" in p.lower()
-    
-    # Period type
-    if "Three Months" in p:
-        period_type = "Three Months"
-    elif "Six Months" in p:
-        period_type = "Six Months"
-    elif "Year Ended" in p:
-        period_type = "Year Ended"
-    else:
-        period_type = "Point-in-Time"
-    
-    # Extract date
-    match = re.search(r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s*\d{4}", p)
-    if match:
-        end_date = match.group(0)
-        year = int(re.search(r"\d{4}", end_date).group(0))
-    else:
-        match = re.search(r"\d{4}", p)
-        if match:
-            year = int(match.group(0))
-            end_date = str(year)
-        else:
-            year, end_date = None, None
-    
-    return pd.Series([period_type, end_date, unaudited, year])
+    unaudited = s.str.contains("unaudited", case=False, regex=False)
+
+    # Period type cascade
+    period_type = np.select(
+        [s.str.contains("Three Months", regex=False),
+         s.str.contains("Six Months", regex=False),
+         s.str.contains("Year Ended", regex=False)],
+        ["Three Months", "Six Months", "Year Ended"],
+        default="Point-in-Time",
+    )
+
+    # Extract date: full "Month D, YYYY" first, bare year as fallback
+    end_date = s.str.extract(_DATE_RE, expand=False)
+    year = end_date.str.extract(_YEAR_RE, expand=False)
+    bare_year = s.str.extract(_YEAR_RE, expand=False)
+    end_date = end_date.fillna(bare_year)
+    year = pd.to_numeric(year.fillna(bare_year), errors="coerce")
+
+    parsed = pd.DataFrame({
+        "Period Type": period_type,
+        "End Date": end_date.to_numpy(),
+        "Unaudited": unaudited.to_numpy(),
+        "Fiscal Year": year.to_numpy(),
+    }, index=s.to_numpy())
+
+    out = parsed.reindex(full.to_numpy())
+    out.index = periods.index
+    return out
 
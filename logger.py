@@ -2,7 +2,7 @@ import logging
 
 # Configure logger (only once in your main script)
 logging.basicConfig(
-    level=logging.DEBUG,  # levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
+    level=logging.INFO,  # levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
         logging.FileHandler("etl_debug.log"),   # log to file
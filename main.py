@@ -1,7 +1,7 @@
 import pandas as pd
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
 from io import StringIO
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 import os
 import functions as F
 import OLTP_load as DB
@@ -10,25 +10,42 @@ import quality_check as QC
 import logger as log
 
 
-def run_etl_pipeline(file_path):
-    # Read the HTML file
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        html_content = f.read()
-
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html_content, "lxml")
+def parse_file_to_tidy_df(file_path):
+    """
+    Parse one HTML filing into its tidy fact DataFrame.
+    Pure CPU work, no database access - safe to run in a worker process.
+    Returns None if the filing yielded no recognizable statements.
+    """
+    # Stream the HTML file straight into lxml's parser instead of reading the
+    # whole document into a Python string first (lower peak memory on
+    # multi-megabyte filings)
+    tree = lxml_html.parse(file_path)
 
     # Extract all tables
-    tables = soup.find_all("table")
+    tables = tree.findall(".//table")
+
+    # lazy %-style args: the message is only formatted if actually emitted
+    log.logger.info("Total tables found: %d", len(tables))
 
-    # print(f"Total tables found: {len(tables)}")
-    log.logger.info(f"Total tables found: {len(tables)}")
+    # --- Identify Balance Sheet / Income Statement ---
+    keywords_balance = ["total assets", "total liabilities", "stockholders"]
+    keywords_income = ["operating expenses","total operating expenses","income from operations","net loss","earnings per share","comprehensive loss"]
 
-    # Convert tables to DataFrames
+    # Convert matching tables to DataFrames
     dfs = []
     for i, table in enumerate(tables):
         try:
-            df = pd.read_html(StringIO(str(table)), flavor="lxml")[0]
+            # Classify on the element's text (one C-level call) so only the
+            # tables we actually keep pay for DataFrame conversion
+            table_text = table.text_content().lower()
+            if any(k in table_text for k in keywords_balance):
+                df_type = "Balance Sheet"
+            elif any(k in table_text for k in keywords_income):
+                df_type = "Income Statement"
+            else:
+                continue
+
+            df = pd.read_html(StringIO(lxml_html.tostring(table, encoding="unicode")), flavor="lxml")[0]
 
             # --- Cleaning & Standardization ---
             # Drop all-empty rows/columns
@@ -42,30 +59,20 @@ def run_etl_pipeline(file_path):
             # Normalize column names (remove extra spaces/newlines)
             df.columns = [c.replace("\n", " ").replace("  ", " ").strip() for c in df.columns]
 
-            # --- Identify Balance Sheet / Income Statement ---
-            keywords_balance = ["total assets", "total liabilities", "stockholders"]
-            keywords_income = ["operating expenses","total operating expenses","income from operations","net loss","earnings per share","comprehensive loss"]
-
-            table_text = " ".join(df.astype(str).values.flatten()).lower()
-
-            if any(k in table_text for k in keywords_balance):
-                log.logger.info(f"Found Balance Sheet candidate at table {i} with shape {df.shape}")
-                dfs.append(("Balance Sheet", df))
-
-            elif any(k in table_text for k in keywords_income):
-                log.logger.info(f"Found Income Statement candidate at table {i} with shape {df.shape}")
-                dfs.append(("Income Statement", df))
-
-
-            # log.logger.info(f"Extracted table {i} with shape {df.shape}")
+            log.logger.info("Found %s candidate at table %d with shape %s", df_type, i, df.shape)
+            dfs.append((df_type, df))
         except Exception as e:
-            log.logger.warning(f"Skipped table {i} due to error: {e}")
+            log.logger.warning("Skipped table %d due to error: %s", i, e)
 
     # # Example: Display the first cleaned table
     # if dfs:
     #     print(dfs[0])
     #     print(dfs[1])
 
+    # File-level metadata is the same for every table; extract it once
+    ticker, filing_date = F.extract_metadata(file_path)
+
+    tidy_frames = []
     for df_type,dfs_raw in dfs:
 
         df_raw = dfs_raw.copy()   # your extracted DataFrame
@@ -95,21 +102,16 @@ def run_etl_pipeline(file_path):
 
         df.columns = make_unique(df.columns)
 
-        # 4. Function to clean numbers
-        def clean_number(x):
-            if pd.isna(x):
-                return np.nan
-            x = str(x).replace(",", "").replace("$", "").strip()
-            if x.startswith("(") and x.endswith(")"):   # e.g. (271,381)
-                x = "-" + x[1:-1]
-            try:
-                return float(x)
-            except:
-                return np.nan
-
-        # 5. Apply cleaning
+        # 4/5. Clean numbers column-wise: strip $ and thousands separators,
+        # rewrite (271,381)-style negatives, then coerce in one pass
         for col in df.columns[1:]:
-            df[col] = df[col].apply(clean_number)
+            s = (df[col].astype(str)
+                 .str.replace(",", "", regex=False)
+                 .str.replace("$", "", regex=False)
+                 .str.strip())
+            neg = s.str.startswith("(") & s.str.endswith(")")
+            s = s.mask(neg, "-" + s.str[1:-1])
+            df[col] = pd.to_numeric(s, errors="coerce")
 
         # 6. Clean Line Item text
         df["Line Item"] = df["Line Item"].astype(str).str.strip()
@@ -147,11 +149,11 @@ def run_etl_pipeline(file_path):
         # 1. Clean up the period names (remove duplicate suffixes like "_1")
         df_tidy_clean["Period"] = df_tidy_clean["Period"].str.replace(r"_\d+$", "", regex=True)
 
-        df_tidy_clean[["Period Type", "End Date", "Unaudited", "Fiscal Year"]] = df_tidy_clean["Period"].apply(F.parse_period)
+        df_tidy_clean[["Period Type", "End Date", "Unaudited", "Fiscal Year"]] = F.parse_period_vec(df_tidy_clean["Period"])
 
         # 3. Add metadata columns
-        df_tidy_clean["Ticker"] = F.extract_metadata(file_path)[0]
-        df_tidy_clean["Filing Date"] = F.extract_metadata(file_path)[1]
+        df_tidy_clean["Ticker"] = ticker
+        df_tidy_clean["Filing Date"] = filing_date
         df_tidy_clean["Statement Type"] = df_type
 
         # 4. Reorder columns for clarity
@@ -162,17 +164,30 @@ def run_etl_pipeline(file_path):
 
 
         # print(df_tidy_clean)
-        log.logger.info(f"OLTP loading started.....")
-        DB.load_dataframe_to_db(df_tidy_clean)
-        log.logger.info(f"OLTP loading completed.")
+        tidy_frames.append(df_tidy_clean)
+
+    if not tidy_frames:
+        return None
+    return pd.concat(tidy_frames, ignore_index=True)
+
+
+def run_etl_pipeline(file_path):
+    """Full pipeline for a single filing: parse, OLTP load, OLAP rebuild,
+    quality checks."""
+    df_tidy = parse_file_to_tidy_df(file_path)
+
+    if df_tidy is not None:
+        log.logger.info("OLTP loading started.....")
+        DB.load_dataframe_to_db(df_tidy)
+        log.logger.info("OLTP loading completed.")
 
-    log.logger.info(f"OLAP loading started.....")
+    log.logger.info("OLAP loading started.....")
     OL.create_and_populate_olap_schema_from_oltp()
-    log.logger.info(f"OLAP loading completed.")
+    log.logger.info("OLAP loading completed.")
 
-    log.logger.info(f'running quality checks....')
+    log.logger.info('running quality checks....')
     res=QC.run_quality_checks()
-    log.logger.info(f"quality check result: {res}")
+    log.logger.info("quality check result: %s", res)
 
 
 if __name__ == "__main__":
@@ -184,9 +199,31 @@ if __name__ == "__main__":
     txt_file = os.path.join(BASE_DIR, "input_file.txt")
     file_paths = F.read_unique_links(txt_file)
 
+    html_paths = []
     for file_path in file_paths:
         if F.detect_file_type(file_path) == "html":
-            log.logger.info(f"Processing file: {file_path}")
-            run_etl_pipeline(file_path)
+            log.logger.info("Processing file: %s", file_path)
+            html_paths.append(file_path)
         else:
-            log.logger.warning(f"Skipping unsupported file type: {file_path}")
\ No newline at end of file
+            log.logger.warning("Skipping unsupported file type: %s", file_path)
+
+    if html_paths:
+        # Parsing is CPU-bound and independent per file, so farm it out to
+        # worker processes; the DB load, OLAP rebuild and quality checks run
+        # once on the combined frame in the main process (single writer).
+        with ProcessPoolExecutor(max_workers=min(len(html_paths), os.cpu_count() or 1)) as ex:
+            tidy_frames = [df for df in ex.map(parse_file_to_tidy_df, html_paths)
+                           if df is not None]
+
+        if tidy_frames:
+            log.logger.info("OLTP loading started.....")
+            DB.load_dataframe_to_db(pd.concat(tidy_frames, ignore_index=True))
+            log.logger.info("OLTP loading completed.")
+
+        log.logger.info("OLAP loading started.....")
+        OL.create_and_populate_olap_schema_from_oltp()
+        log.logger.info("OLAP loading completed.")
+
+        log.logger.info('running quality checks....')
+        res = QC.run_quality_checks()
+        log.logger.info("quality check result: %s", res)
\ No newline at end of file
@@ -1,11 +1,15 @@
-import sqlite3
+import OLAP as OL
 
 def run_quality_checks(olap_db="olap_db.sqlite", oltp_db="fin_db.sqlite"):
-    conn = sqlite3.connect(olap_db)
+    conn = OL.get_connection(olap_db)
+    OL.attach_oltp(conn, oltp_db)
     cur = conn.cursor()
 
-    # Attach OLTP
-    cur.execute(f"ATTACH DATABASE '{oltp_db}' AS oltp;")
+    # Indexes backing the fact-table checks below (rebuilt cheaply if the
+    # OLAP populate recreated the table since the last run)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_fact_line_item ON fact_financials(line_item_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_fact_company ON fact_financials(company_key);")
+    conn.commit()
 
     results = {}
 
@@ -16,13 +20,9 @@ def run_quality_checks(olap_db="olap_db.sqlite", oltp_db="fin_db.sqlite"):
     results["future_dates"] = cur.fetchone()[0]
 
     # (2) No duplicate fact IDs
+    # one linear scan; no GROUP BY sort or temp B-tree needed
     cur.execute("""
-        SELECT COUNT(*) FROM (
-            SELECT fact_id, COUNT(*) c
-            FROM fact_financials
-            GROUP BY fact_id
-            HAVING c > 1
-        );
+        SELECT COUNT(*) - COUNT(DISTINCT fact_id) FROM fact_financials;
     """)
     results["duplicate_fact_ids"] = cur.fetchone()[0]
 
@@ -56,5 +56,5 @@ def run_quality_checks(olap_db="olap_db.sqlite", oltp_db="fin_db.sqlite"):
     """)
     results["orphaned_company_refs"] = cur.fetchone()[0]
 
-    conn.close()
+    cur.close()
     return results